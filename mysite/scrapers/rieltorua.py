@@ -3,10 +3,8 @@ import datetime
 
 from typing import Dict, Optional, Tuple, List
 
-from bs4 import BeautifulSoup
-
 from mysite.scrapers.scraperParentClass import WebScraper
-from mysite.service.databasehandler import DatabaseHandler
+from mysite.service.resilience import ErrorAggregator, classify_failure
 
 class RieltorScraper(WebScraper):
     """
@@ -14,9 +12,19 @@ class RieltorScraper(WebScraper):
     Extracts property details and updates the database.
     """
 
-    def __init__(self, listing_url: str):
-        super().__init__(website_url=listing_url)
+    def __init__(self, listing_url: str, archive=None):
+        super().__init__(website_url=listing_url, archive=archive)
         self.listing_url = listing_url
+        self.listing_id = self.extract_listing_id(listing_url)
+
+    @staticmethod
+    def extract_listing_id(listing_url: str) -> int:
+        """
+        Extracts the rieltor.ua offer ID from a listing URL like .../flats-rent/view/11717289/.
+        Returns 0 if the URL does not contain an ID.
+        """
+        id_match = re.search(r'/view/(\d+)', listing_url)
+        return int(id_match.group(1)) if id_match else 0
 
     def scrape_property_details(self) -> Dict:
         """
@@ -27,7 +35,16 @@ class RieltorScraper(WebScraper):
         if not response:
             return {}
 
-        soup = BeautifulSoup(response.text, "html.parser")
+        return self.parse_property_details(response.text)
+
+    def parse_property_details(self, html: str) -> Dict:
+        """
+        Extracts the property details from the HTML of a listing page.
+        Makes no requests, so it can be rerun over archived pages.
+        """
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "html.parser")
 
         # Initialize property details dictionary
         property_details = {
@@ -100,29 +117,36 @@ class RieltorScraper(WebScraper):
         return property_details
 
 
-def scrape_and_update_listing(url: str, db_config: Dict = None) -> bool:
+def scrape_and_update_listing(url: str, db_config: Dict = None, errors: Optional[ErrorAggregator] = None,
+                              archive=None) -> bool:
     """
     Scrapes a property listing and updates the database.
 
     Args:
         url: The URL of the property listing
         db_config: Optional database configuration
+        errors: Optional error aggregator. When given, failures are collected there
+            and written later in batches instead of one SCRAPPING_ERROR row per call
+        archive: Optional PageArchive to store the fetched page in
 
     Returns:
         True if successful, False otherwise
     """
+    from mysite.service.databasehandler import DatabaseHandler
+
     try:
         # Initialize scraper and database handler
-        scraper = RieltorScraper(url)
+        scraper = RieltorScraper(url, archive=archive)
         db_handler = DatabaseHandler(**(db_config or {}))
 
         # Scrape property details
         property_details = scraper.scrape_property_details()
         if not property_details:
-            db_handler.log_scraping_error(
-                scraper.listing_id,
-                f"Failed to scrape property details from {url}"
-            )
+            message = f"Failed to scrape property details from {url}"
+            if errors is not None:
+                errors.add(url, scraper.listing_id, classify_failure(scraper.last_error), message)
+            else:
+                db_handler.log_scraping_error(scraper.listing_id, message)
             return False
 
         # Check if listing exists
@@ -152,12 +176,17 @@ def scrape_and_update_listing(url: str, db_config: Dict = None) -> bool:
         # Update availability (assuming listing is available if we could scrape it)
         db_handler.update_availability(scraper.listing_id, True)
 
+        if errors is not None:
+            errors.discard(url)
         return True
     except Exception as e:
         print(f"Error scraping and updating listing: {e}")
+        listing_id = scraper.listing_id if 'scraper' in locals() else 0
+        if errors is not None:
+            errors.add(url, listing_id, classify_failure(e), str(e))
+            return False
         # Try to log the error if possible
         try:
-            listing_id = scraper.listing_id if 'scraper' in locals() else 0
             db_handler = DatabaseHandler(**(db_config or {}))
             db_handler.log_scraping_error(listing_id, str(e))
         except:
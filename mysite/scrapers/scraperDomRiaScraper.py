@@ -1,15 +1,13 @@
 import re
 import datetime
 from typing import Dict, Optional
-from bs4 import BeautifulSoup
 
 from mysite.scrapers.scraperParentClass import WebScraper
-from mysite.service.databasehandler import DatabaseHandler
 
 class DomRiaScraper(WebScraper):
 
-    def __init__(self, listing_url: str):
-        super().__init__(website_url=listing_url)
+    def __init__(self, listing_url: str, archive=None):
+        super().__init__(website_url=listing_url, archive=archive)
         self.listing_url = listing_url
 
     
@@ -18,9 +16,16 @@ class DomRiaScraper(WebScraper):
         response = self.get_page()
         if not response:
             return {}
-        
 
-        soup = BeautifulSoup(response.text, "html.parser")
+        property_details = self.parse_property_details(response.text)
+        print(property_details)
+        return property_details
+
+    def parse_property_details(self, html: str) -> Dict:
+
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "html.parser")
         
         property_details = {
             'url': self.listing_url,
@@ -82,7 +87,7 @@ class DomRiaScraper(WebScraper):
                         except ValueError:
                             pass
 
-        print(property_details)
+        return property_details
 
 
 
@@ -1,32 +1,58 @@
-from bs4 import BeautifulSoup
-import requests
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, Optional
 import re
 
+# requests and bs4 are imported where they are used, parse-only workers never load requests
+if TYPE_CHECKING:
+    import requests
+    from bs4 import BeautifulSoup
+
 class WebScraper:
 
-    def __init__(self, website_url:str, headers: dict = None, remove_tags=None, remove_styles=None):
+    def __init__(self, website_url:str, headers: dict = None, remove_tags=None, remove_styles=None, timeout: float = 10,
+                 archive=None):
 
         self.website_url = website_url
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:132.0) Gecko/20100101 Firefox/132.0'
         }
+        self.timeout = timeout
+        # Error of the last failed request, used to tell host outages from broken pages
+        self.last_error = None
+        # Optional PageArchive that keeps the raw HTML of every fetched page
+        self.archive = archive
 
  
-    def get_page(self) -> Optional[requests.Response]:
+    def get_page(self) -> Optional['requests.Response']:
+
+        import requests
 
+        self.last_error = None
         try:
-            response = requests.get(self.website_url, headers=self.headers)
+            response = requests.get(self.website_url, headers=self.headers, timeout=self.timeout)
             response.raise_for_status()
+            self.archive_page(response)
             return response
         except requests.exceptions.HTTPError as err:
             if err.response is not None and err.response.status_code == 410:
                 return err.response
+            self.last_error = err
+            return None
         except Exception as err:
             print(f"Other error occcured: {err}")
+            self.last_error = err
             return None
     
-    def extract_data(self, soup: BeautifulSoup) -> Dict[str, Optional[str]]:
+    def archive_page(self, response: 'requests.Response') -> None:
+
+        if self.archive is None:
+            return
+        try:
+            self.archive.store(self.website_url, response.text)
+        except Exception as err:
+            # Archiving is best effort and must never break scraping
+            print(f"Error archiving page: {err}")
+
+    def extract_data(self, soup: 'BeautifulSoup') -> Dict[str, Optional[str]]:
         raise NotImplementedError("Method extract_data() should be imlemented in child class")
 
     
@@ -50,6 +76,8 @@ class WebScraper:
                 return {"url": self.website_url, "price": None, "availability": "deleted"}
 
         if response:
+            from bs4 import BeautifulSoup
+
             soup = BeautifulSoup(response.text, "html.parser")
             return self.extract_data(soup)
         else:
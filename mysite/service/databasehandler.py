@@ -1,8 +1,16 @@
 
 import re
 import datetime
-import mysql.connector
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from mysite.service.rollups import BUCKETS, bucket_start, bucket_start_sql
+
+
+def _connector():
+    """Returns mysql.connector, imported on first use so importing this module stays cheap."""
+    import mysql.connector
+    return mysql.connector
+
 
 class DatabaseHandler:
     """
@@ -21,9 +29,9 @@ class DatabaseHandler:
     def connect(self):
         """Establishes a connection to the MySQL database."""
         try:
-            connection = mysql.connector.connect(**self.config)
+            connection = _connector().connect(**self.config)
             return connection
-        except mysql.connector.Error as err:
+        except _connector().Error as err:
             print(f"Error connecting to MySQL database: {err}")
             return None
 
@@ -42,7 +50,7 @@ class DatabaseHandler:
             cursor.execute(query, (listing_id,))
             result = cursor.fetchone()
             return result
-        except mysql.connector.Error as err:
+        except _connector().Error as err:
             print(f"Error checking if listing exists: {err}")
             return None
         finally:
@@ -89,7 +97,7 @@ class DatabaseHandler:
 
             connection.commit()
             return last_insert_id
-        except mysql.connector.Error as err:
+        except _connector().Error as err:
             print(f"Error inserting listing: {err}")
             return None
         finally:
@@ -133,7 +141,7 @@ class DatabaseHandler:
             cursor.execute(query, values)
             connection.commit()
             return True
-        except mysql.connector.Error as err:
+        except _connector().Error as err:
             print(f"Error updating listing: {err}")
             return False
         finally:
@@ -141,6 +149,48 @@ class DatabaseHandler:
                 cursor.close()
                 connection.close()
 
+    def backfill_listing_details(self, listing_id: int, property_details: Dict,
+                                 fetched_at: datetime.datetime) -> bool:
+        """
+        Updates the parsed fields of a listing from a page fetched at `fetched_at`.
+        Listings checked after the fetch are left alone, so an old page never overwrites newer data.
+        Price and check time are not touched, they belong to the scraper and PRICE_HISTORY.
+        Returns True if the listing was updated, False otherwise.
+        """
+        update_parts = []
+        values = []
+        for field in ['DESCRIPTION', 'NUMBER_OF_ROOMS', 'TOTAL_AREA', 'FLOOR']:
+            key = field.lower()
+            if key in property_details and property_details[key] is not None:
+                update_parts.append(f"{field} = %s")
+                values.append(property_details[key])
+
+        if not update_parts:
+            return False
+
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+
+            values.extend([listing_id, fetched_at])
+            query = f"""
+                UPDATE LISTING SET {', '.join(update_parts)} 
+                WHERE ID = %s AND (LAST_CHECKED_AT IS NULL OR LAST_CHECKED_AT <= %s)
+            """
+            cursor.execute(query, values)
+            connection.commit()
+            return cursor.rowcount > 0
+        except _connector().Error as err:
+            print(f"Error backfilling listing: {err}")
+            return False
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
     def add_price_history(self, listing_id: int, price: int) -> bool:
         """
         Adds a new price history record for a listing.
@@ -158,18 +208,250 @@ class DatabaseHandler:
             result = cursor.fetchone()
             next_id = 1 if result[0] is None else result[0] + 1
 
+            recorded_at = datetime.datetime.now()
             query = "INSERT INTO PRICE_HISTORY (ID, LISTING_ID, PRICE, RECORDED_AT) VALUES (%s, %s, %s, %s)"
-            cursor.execute(query, (next_id, listing_id, price, datetime.datetime.now()))
+            cursor.execute(query, (next_id, listing_id, price, recorded_at))
             connection.commit()
-            return True
-        except mysql.connector.Error as err:
+        except _connector().Error as err:
             print(f"Error adding price history: {err}")
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+            return False
+
+        try:
+            if price is not None:
+                self._update_price_rollups(cursor, listing_id, price, recorded_at)
+                connection.commit()
+        except _connector().Error as err:
+            # The price itself is stored, the next rollup compaction will pick it up
+            print(f"Error updating price rollups: {err}")
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+        return True
+
+    def _update_price_rollups(self, cursor, listing_id: int, price: int, recorded_at: datetime.datetime) -> None:
+        """
+        Folds a single new price into the daily and weekly rollups
+        of the listing and of its (source website, number of rooms) segment.
+        """
+        listing_rows = [
+            (listing_id, bucket, bucket_start(recorded_at, bucket), price, price, price, recorded_at, 1)
+            for bucket in BUCKETS
+        ]
+        cursor.executemany("""
+            INSERT INTO PRICE_ROLLUP_LISTING 
+            (LISTING_ID, BUCKET, BUCKET_START, MIN_PRICE, MAX_PRICE, LAST_PRICE, LAST_RECORDED_AT, PRICE_COUNT) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) AS new 
+            ON DUPLICATE KEY UPDATE 
+                MIN_PRICE = LEAST(MIN_PRICE, new.MIN_PRICE), 
+                MAX_PRICE = GREATEST(MAX_PRICE, new.MAX_PRICE), 
+                LAST_PRICE = IF(new.LAST_RECORDED_AT >= LAST_RECORDED_AT, new.LAST_PRICE, LAST_PRICE), 
+                LAST_RECORDED_AT = GREATEST(LAST_RECORDED_AT, new.LAST_RECORDED_AT), 
+                PRICE_COUNT = PRICE_COUNT + new.PRICE_COUNT
+        """, listing_rows)
+
+        cursor.execute("SELECT SOURCE_WEBSITE, NUMBER_OF_ROOMS FROM LISTING WHERE ID = %s", (listing_id,))
+        listing = cursor.fetchone()
+        if listing is None:
+            return
+
+        source_website, number_of_rooms = listing
+        segment_rows = [
+            (source_website or '', number_of_rooms or 0, bucket, bucket_start(recorded_at, bucket),
+             price, price, price, recorded_at, 1, price)
+            for bucket in BUCKETS
+        ]
+        cursor.executemany("""
+            INSERT INTO PRICE_ROLLUP_SEGMENT 
+            (SOURCE_WEBSITE, NUMBER_OF_ROOMS, BUCKET, BUCKET_START, 
+             MIN_PRICE, MAX_PRICE, LAST_PRICE, LAST_RECORDED_AT, PRICE_COUNT, PRICE_SUM) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) AS new 
+            ON DUPLICATE KEY UPDATE 
+                MIN_PRICE = LEAST(MIN_PRICE, new.MIN_PRICE), 
+                MAX_PRICE = GREATEST(MAX_PRICE, new.MAX_PRICE), 
+                LAST_PRICE = IF(new.LAST_RECORDED_AT >= LAST_RECORDED_AT, new.LAST_PRICE, LAST_PRICE), 
+                LAST_RECORDED_AT = GREATEST(LAST_RECORDED_AT, new.LAST_RECORDED_AT), 
+                PRICE_COUNT = PRICE_COUNT + new.PRICE_COUNT, 
+                PRICE_SUM = PRICE_SUM + new.PRICE_SUM
+        """, segment_rows)
+
+    def compact_price_rollups(self, since: datetime.datetime) -> bool:
+        """
+        Rebuilds all rollup buckets that overlap the period from `since` until now
+        from the raw PRICE_HISTORY rows. With an early `since` this backfills the rollups
+        from history recorded before they existed.
+        Returns True if successful, False otherwise.
+        """
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+
+            for bucket in BUCKETS:
+                first_bucket = bucket_start(since, bucket)
+                listing_bucket = bucket_start_sql(bucket)
+                segment_bucket = bucket_start_sql(bucket, 'ph.RECORDED_AT')
+
+                cursor.execute(
+                    "DELETE FROM PRICE_ROLLUP_LISTING WHERE BUCKET = %s AND BUCKET_START >= %s",
+                    (bucket, first_bucket)
+                )
+                cursor.execute(f"""
+                    INSERT INTO PRICE_ROLLUP_LISTING 
+                    (LISTING_ID, BUCKET, BUCKET_START, MIN_PRICE, MAX_PRICE, LAST_PRICE, LAST_RECORDED_AT, PRICE_COUNT) 
+                    SELECT LISTING_ID, %s, {listing_bucket}, MIN(PRICE), MAX(PRICE), 
+                        CAST(SUBSTRING_INDEX(GROUP_CONCAT(PRICE ORDER BY RECORDED_AT DESC, ID DESC), ',', 1) AS SIGNED), 
+                        MAX(RECORDED_AT), COUNT(*) 
+                    FROM PRICE_HISTORY 
+                    WHERE RECORDED_AT >= %s AND PRICE IS NOT NULL 
+                    GROUP BY LISTING_ID, {listing_bucket}
+                """, (bucket, first_bucket))
+
+                cursor.execute(
+                    "DELETE FROM PRICE_ROLLUP_SEGMENT WHERE BUCKET = %s AND BUCKET_START >= %s",
+                    (bucket, first_bucket)
+                )
+                cursor.execute(f"""
+                    INSERT INTO PRICE_ROLLUP_SEGMENT 
+                    (SOURCE_WEBSITE, NUMBER_OF_ROOMS, BUCKET, BUCKET_START, 
+                     MIN_PRICE, MAX_PRICE, LAST_PRICE, LAST_RECORDED_AT, PRICE_COUNT, PRICE_SUM) 
+                    SELECT COALESCE(l.SOURCE_WEBSITE, ''), COALESCE(l.NUMBER_OF_ROOMS, 0), %s, {segment_bucket}, 
+                        MIN(ph.PRICE), MAX(ph.PRICE), 
+                        CAST(SUBSTRING_INDEX(GROUP_CONCAT(ph.PRICE ORDER BY ph.RECORDED_AT DESC, ph.ID DESC), ',', 1) 
+                             AS SIGNED), 
+                        MAX(ph.RECORDED_AT), COUNT(*), SUM(ph.PRICE) 
+                    FROM PRICE_HISTORY ph 
+                    JOIN LISTING l ON l.ID = ph.LISTING_ID 
+                    WHERE ph.RECORDED_AT >= %s AND ph.PRICE IS NOT NULL 
+                    GROUP BY COALESCE(l.SOURCE_WEBSITE, ''), COALESCE(l.NUMBER_OF_ROOMS, 0), {segment_bucket}
+                """, (bucket, first_bucket))
+
+            connection.commit()
+            return True
+        except _connector().Error as err:
+            print(f"Error compacting price rollups: {err}")
+            connection.rollback()
+            return False
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+    def prune_price_history(self, raw_before: datetime.datetime, daily_before: datetime.date) -> bool:
+        """
+        Applies rollup retention.
+        Raw price rows recorded before `raw_before` are thinned to the last price of each day,
+        but only for days that are already rolled up. Daily rollups starting before
+        `daily_before` are dropped, weekly rollups are kept.
+        Returns True if successful, False otherwise.
+        """
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+
+            cursor.execute("""
+                DELETE ph FROM PRICE_HISTORY ph 
+                JOIN PRICE_ROLLUP_LISTING r 
+                    ON r.LISTING_ID = ph.LISTING_ID AND r.BUCKET = 'day' AND r.BUCKET_START = DATE(ph.RECORDED_AT) 
+                WHERE ph.RECORDED_AT < %s AND ph.RECORDED_AT < r.LAST_RECORDED_AT
+            """, (raw_before,))
+
+            cursor.execute(
+                "DELETE FROM PRICE_ROLLUP_LISTING WHERE BUCKET = 'day' AND BUCKET_START < %s",
+                (daily_before,)
+            )
+            cursor.execute(
+                "DELETE FROM PRICE_ROLLUP_SEGMENT WHERE BUCKET = 'day' AND BUCKET_START < %s",
+                (daily_before,)
+            )
+
+            connection.commit()
+            return True
+        except _connector().Error as err:
+            print(f"Error pruning price history: {err}")
+            connection.rollback()
             return False
         finally:
             if connection.is_connected():
                 cursor.close()
                 connection.close()
 
+    def get_listing_price_rollups(self, listing_id: int, bucket: str = 'day') -> List[Dict]:
+        """
+        Returns the price path of a listing as rollup rows ordered by bucket start.
+        """
+        connection = self.connect()
+        if not connection:
+            return []
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT BUCKET_START, MIN_PRICE, MAX_PRICE, LAST_PRICE, PRICE_COUNT 
+                FROM PRICE_ROLLUP_LISTING 
+                WHERE LISTING_ID = %s AND BUCKET = %s 
+                ORDER BY BUCKET_START
+            """, (listing_id, bucket))
+            return cursor.fetchall()
+        except _connector().Error as err:
+            print(f"Error reading listing price rollups: {err}")
+            return []
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+    def get_segment_price_rollups(self, source_website: str, number_of_rooms: Optional[int] = None,
+                                  bucket: str = 'week', since: Optional[datetime.date] = None) -> List[Dict]:
+        """
+        Returns price trends of a (source website, number of rooms) segment ordered by bucket start.
+        Without number_of_rooms, returns the rows of all room counts of the source website.
+
+        Segment rollups are built from PRICE_HISTORY, which only gets a row for a new listing or
+        a price change. MIN/MAX/LAST and AVG_RECORDED_PRICE therefore describe the prices recorded
+        in the bucket, not the asking rent of every listing in the segment: listings whose price
+        did not change in the bucket are not part of them.
+        """
+        connection = self.connect()
+        if not connection:
+            return []
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+
+            conditions = ["SOURCE_WEBSITE = %s", "BUCKET = %s"]
+            values = [source_website, bucket]
+            if number_of_rooms is not None:
+                conditions.append("NUMBER_OF_ROOMS = %s")
+                values.append(number_of_rooms)
+            if since is not None:
+                conditions.append("BUCKET_START >= %s")
+                values.append(since)
+
+            cursor.execute(f"""
+                SELECT NUMBER_OF_ROOMS, BUCKET_START, MIN_PRICE, MAX_PRICE, LAST_PRICE, PRICE_COUNT, 
+                    PRICE_SUM / PRICE_COUNT AS AVG_RECORDED_PRICE 
+                FROM PRICE_ROLLUP_SEGMENT 
+                WHERE {' AND '.join(conditions)} 
+                ORDER BY NUMBER_OF_ROOMS, BUCKET_START
+            """, values)
+            return cursor.fetchall()
+        except _connector().Error as err:
+            print(f"Error reading segment price rollups: {err}")
+            return []
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
     def update_availability(self, listing_id: int, is_available: bool) -> bool:
         """
         Updates the availability history for a listing.
@@ -209,7 +491,7 @@ class DatabaseHandler:
                 connection.commit()
 
             return True
-        except mysql.connector.Error as err:
+        except _connector().Error as err:
             print(f"Error updating availability: {err}")
             return False
         finally:
@@ -242,10 +524,83 @@ class DatabaseHandler:
             cursor.execute(query, (next_id, listing_id, error_message, datetime.datetime.now()))
             connection.commit()
             return True
-        except mysql.connector.Error as err:
+        except _connector().Error as err:
             print(f"Error logging scraping error: {err}")
             return False
         finally:
             if connection.is_connected():
                 cursor.close()
-                connection.close()
\ No newline at end of file
+                connection.close()
+
+    def log_scraping_errors(self, errors: List[Tuple[int, str]]) -> bool:
+        """
+        Logs a batch of scraping errors as (listing_id, error_message) pairs
+        using a single connection and a single insert.
+        Errors of listings that are not in LISTING cannot be stored (LISTING_ID is a foreign key)
+        and are skipped. If the batch insert fails, the rows are inserted one by one so a single
+        bad row does not lose the rest.
+        Returns True if all storable rows were written, False otherwise.
+        """
+        if not errors:
+            return True
+
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+
+            listing_ids = sorted({listing_id for listing_id, _ in errors})
+            cursor.execute(
+                f"SELECT ID FROM LISTING WHERE ID IN ({', '.join(['%s'] * len(listing_ids))})",
+                listing_ids
+            )
+            known_ids = {row[0] for row in cursor.fetchall()}
+            storable = [error for error in errors if error[0] in known_ids]
+            if len(storable) < len(errors):
+                print(f"Skipping {len(errors) - len(storable)} scraping errors of listings not in LISTING")
+            if not storable:
+                return True
+
+            # Reserve a contiguous block of IDs for the whole batch
+            cursor.execute("SELECT MAX(ID) FROM SCRAPPING_ERROR")
+            result = cursor.fetchone()
+            first_id = 1 if result[0] is None else result[0] + 1
+
+            occurred_at = datetime.datetime.now()
+            rows = [
+                (first_id + offset, listing_id, error_message, occurred_at)
+                for offset, (listing_id, error_message) in enumerate(storable)
+            ]
+
+            query = """
+                INSERT INTO SCRAPPING_ERROR 
+                (ID, LISTING_ID, ERROR_MESSAGE, OCCURRED_AT) 
+                VALUES (%s, %s, %s, %s)
+            """
+            try:
+                cursor.executemany(query, rows)
+                connection.commit()
+                return True
+            except _connector().Error as err:
+                print(f"Error logging scraping errors as a batch, retrying row by row: {err}")
+                connection.rollback()
+
+            failed = 0
+            for row in rows:
+                try:
+                    cursor.execute(query, row)
+                    connection.commit()
+                except _connector().Error as err:
+                    print(f"Error logging scraping error for listing {row[1]}: {err}")
+                    connection.rollback()
+                    failed += 1
+            return failed == 0
+        except _connector().Error as err:
+            print(f"Error logging scraping errors: {err}")
+            return False
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
@@ -0,0 +1,247 @@
+import os
+import hashlib
+import datetime
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import zstandard
+
+
+def _zstandard():
+    """Returns the optional zstandard module, imported on first use."""
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Page archive requires the 'zstandard' package")
+    return zstandard
+
+
+class ArchiveEntry:
+    """
+    One index record of the page archive.
+    Points at a compressed page inside a segment file.
+    """
+
+    __slots__ = ('content_hash', 'segment', 'offset', 'length', 'dict_id', 'fetched_at', 'url')
+
+    def __init__(self, content_hash: str, segment: int, offset: int, length: int, dict_id: int,
+                 fetched_at: datetime.datetime, url: str):
+        self.content_hash = content_hash
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.dict_id = dict_id
+        self.fetched_at = fetched_at
+        self.url = url
+
+    def to_line(self) -> str:
+        return '\t'.join([
+            self.content_hash, str(self.segment), str(self.offset), str(self.length),
+            str(self.dict_id), self.fetched_at.isoformat(), self.url
+        ]) + '\n'
+
+    @classmethod
+    def from_line(cls, line: str) -> 'ArchiveEntry':
+        content_hash, segment, offset, length, dict_id, fetched_at, url = line.rstrip('\n').split('\t', 6)
+        return cls(content_hash, int(segment), int(offset), int(length), int(dict_id),
+                   datetime.datetime.fromisoformat(fetched_at), url)
+
+
+class PageArchive:
+    """
+    Append-only archive of fetched HTML pages.
+
+    Pages are compressed with zstd, using a dictionary trained on previously archived
+    pages once enough of them exist. Identical pages are stored once: a refetch with
+    the same content only adds an index record. Compressed pages are appended to
+    numbered segment files and `index.tsv` maps every fetch to (segment, offset, length).
+
+    The archive expects a single writer; any number of processes may read it.
+    """
+
+    INDEX_FILE = 'index.tsv'
+    SEGMENTS_DIR = 'segments'
+    DICTIONARIES_DIR = 'dictionaries'
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, level: int = 10,
+                 train_after: int = 200, dict_size: int = 112640):
+        # Fail early if the optional dependency is missing
+        _zstandard()
+
+        self.directory = directory
+        self.segment_size = segment_size
+        self.level = level
+        self.train_after = train_after
+        self.dict_size = dict_size
+
+        os.makedirs(os.path.join(directory, self.SEGMENTS_DIR), exist_ok=True)
+        os.makedirs(os.path.join(directory, self.DICTIONARIES_DIR), exist_ok=True)
+
+        # Index is only loaded by writers and full scans, readers of single entries skip it
+        self._entries: Optional[List[ArchiveEntry]] = None
+        self._by_hash: Dict[str, ArchiveEntry] = {}
+        self._dictionaries: Dict[int, 'zstandard.ZstdCompressionDict'] = {}
+        self._decompressors: Dict[int, 'zstandard.ZstdDecompressor'] = {}
+        self._compressor = None
+        self._current_dict_id = 0
+        self._active_segment = None
+        self._index_terminated = False
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, self.SEGMENTS_DIR, f'{segment:08d}.seg')
+
+    def _dictionary_path(self, dict_id: int) -> str:
+        return os.path.join(self.directory, self.DICTIONARIES_DIR, f'{dict_id}.dict')
+
+    def _load_index(self) -> List[ArchiveEntry]:
+        if self._entries is None:
+            self._entries = []
+            index_path = os.path.join(self.directory, self.INDEX_FILE)
+            if os.path.exists(index_path):
+                with open(index_path, 'rb') as index_file:
+                    for raw_line in index_file:
+                        try:
+                            # A line without newline is an append torn by a crash or still in progress
+                            if not raw_line.endswith(b'\n'):
+                                raise ValueError("unterminated line")
+                            line = raw_line.decode('utf-8')
+                            if not line.strip():
+                                continue
+                            entry = ArchiveEntry.from_line(line)
+                        except ValueError as err:
+                            print(f"Skipping malformed archive index line: {err}")
+                            continue
+                        self._entries.append(entry)
+                        self._by_hash.setdefault(entry.content_hash, entry)
+
+            # New pages are compressed with the most recently trained dictionary
+            dictionaries_dir = os.path.join(self.directory, self.DICTIONARIES_DIR)
+            dictionaries = [os.path.join(dictionaries_dir, name) for name in os.listdir(dictionaries_dir)]
+            if dictionaries:
+                latest = max(dictionaries, key=os.path.getmtime)
+                self._current_dict_id = int(os.path.basename(latest).split('.')[0])
+        return self._entries
+
+    def _dictionary(self, dict_id: int) -> 'zstandard.ZstdCompressionDict':
+        if dict_id not in self._dictionaries:
+            with open(self._dictionary_path(dict_id), 'rb') as dict_file:
+                self._dictionaries[dict_id] = _zstandard().ZstdCompressionDict(dict_file.read())
+        return self._dictionaries[dict_id]
+
+    def _get_compressor(self) -> 'zstandard.ZstdCompressor':
+        if self._compressor is None:
+            if self._current_dict_id:
+                self._compressor = _zstandard().ZstdCompressor(level=self.level,
+                                                               dict_data=self._dictionary(self._current_dict_id))
+            else:
+                self._compressor = _zstandard().ZstdCompressor(level=self.level)
+        return self._compressor
+
+    def _get_decompressor(self, dict_id: int) -> 'zstandard.ZstdDecompressor':
+        if dict_id not in self._decompressors:
+            if dict_id:
+                self._decompressors[dict_id] = _zstandard().ZstdDecompressor(dict_data=self._dictionary(dict_id))
+            else:
+                self._decompressors[dict_id] = _zstandard().ZstdDecompressor()
+        return self._decompressors[dict_id]
+
+    def _append_blob(self, blob: bytes) -> Tuple[int, int]:
+        """Appends a compressed page to the active segment. Returns (segment, offset)."""
+        if self._active_segment is None:
+            segments = sorted(os.listdir(os.path.join(self.directory, self.SEGMENTS_DIR)))
+            self._active_segment = int(segments[-1].split('.')[0]) if segments else 1
+
+        segment_path = self._segment_path(self._active_segment)
+        if os.path.exists(segment_path) and os.path.getsize(segment_path) + len(blob) > self.segment_size:
+            self._active_segment += 1
+
+        with open(self._segment_path(self._active_segment), 'ab') as segment_file:
+            offset = segment_file.tell()
+            segment_file.write(blob)
+        return self._active_segment, offset
+
+    def _append_entry(self, entry: ArchiveEntry) -> None:
+        line = entry.to_line().encode('utf-8')
+
+        # Unbuffered, so the whole line goes out in a single write
+        with open(os.path.join(self.directory, self.INDEX_FILE), 'ab', buffering=0) as index_file:
+            if not self._index_terminated and index_file.tell() > 0:
+                with open(index_file.name, 'rb') as index_tail:
+                    index_tail.seek(-1, os.SEEK_END)
+                    if index_tail.read(1) != b'\n':
+                        # Terminate a torn line left by a crash, so it is skipped instead of merged with ours
+                        line = b'\n' + line
+            index_file.write(line)
+        self._index_terminated = True
+        self._entries.append(entry)
+        self._by_hash.setdefault(entry.content_hash, entry)
+
+    def store(self, url: str, html: str, fetched_at: Optional[datetime.datetime] = None) -> ArchiveEntry:
+        """
+        Archives a fetched page.
+        Returns the index entry, which reuses the stored blob if the same content was archived before.
+        """
+        self._load_index()
+        fetched_at = fetched_at or datetime.datetime.now()
+        data = html.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        existing = self._by_hash.get(content_hash)
+        if existing:
+            entry = ArchiveEntry(content_hash, existing.segment, existing.offset, existing.length,
+                                 existing.dict_id, fetched_at, url)
+        else:
+            if not self._current_dict_id and len(self._by_hash) >= self.train_after:
+                try:
+                    self.train_dictionary()
+                except _zstandard().ZstdError as err:
+                    print(f"Error training archive dictionary: {err}")
+                    # Try again once twice as many pages are archived
+                    self.train_after *= 2
+
+            blob = self._get_compressor().compress(data)
+            segment, offset = self._append_blob(blob)
+            entry = ArchiveEntry(content_hash, segment, offset, len(blob), self._current_dict_id, fetched_at, url)
+
+        self._append_entry(entry)
+        return entry
+
+    def train_dictionary(self, max_samples: int = 1000) -> int:
+        """
+        Trains a shared zstd dictionary on the most recently archived distinct pages.
+        New pages are compressed with it, already stored pages keep their dictionary.
+        Returns the ID of the new dictionary.
+        """
+        distinct = list(self._by_hash.values())[-max_samples:]
+        samples = [self.read(entry).encode('utf-8') for entry in distinct]
+        dictionary = _zstandard().train_dictionary(self.dict_size, samples, level=self.level)
+
+        dict_id = dictionary.dict_id()
+        with open(self._dictionary_path(dict_id), 'wb') as dict_file:
+            dict_file.write(dictionary.as_bytes())
+
+        self._dictionaries[dict_id] = dictionary
+        self._current_dict_id = dict_id
+        self._compressor = None
+        return dict_id
+
+    def read(self, entry: ArchiveEntry) -> str:
+        """Returns the HTML of an archived page."""
+        with open(self._segment_path(entry.segment), 'rb') as segment_file:
+            segment_file.seek(entry.offset)
+            blob = segment_file.read(entry.length)
+        return self._get_decompressor(entry.dict_id).decompress(blob).decode('utf-8')
+
+    def entries(self, latest_only: bool = True) -> Iterator[ArchiveEntry]:
+        """
+        Iterates over the index.
+        With latest_only, yields only the most recent fetch of every url.
+        """
+        entries = self._load_index()
+        if not latest_only:
+            return iter(list(entries))
+
+        latest: Dict[str, ArchiveEntry] = {}
+        for entry in entries:
+            latest[entry.url] = entry
+        return iter(list(latest.values()))
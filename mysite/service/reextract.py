@@ -0,0 +1,135 @@
+"""
+Reruns the property parsers over the raw page archive.
+Used to backfill listing fields after a selector fix without fetching a single page.
+
+    python -m mysite.service.reextract --archive-dir archive --output details.jsonl
+    python -m mysite.service.reextract --archive-dir archive --update-db
+"""
+
+import os
+import sys
+import json
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from mysite.scrapers.rieltorua import RieltorScraper
+from mysite.scrapers.scraperDomRiaScraper import DomRiaScraper
+from mysite.service.databasehandler import DatabaseHandler
+from mysite.service.pagearchive import ArchiveEntry, PageArchive
+
+# Parser to use for the pages of each source website
+SCRAPERS = {
+    'rieltor.ua': RieltorScraper,
+    'dom.ria.com': DomRiaScraper,
+}
+
+# Archive reader of the current worker process
+_worker_archive: Optional[PageArchive] = None
+
+
+def _init_worker(directory: str) -> None:
+    global _worker_archive
+    _worker_archive = PageArchive(directory)
+
+
+def reextract_entry(entry: ArchiveEntry) -> Optional[Tuple[Optional[int], Optional[Dict], Optional[str]]]:
+    """
+    Parses one archived page.
+    Returns (listing_id, property_details, None) on success, (None, None, error) if the page
+    could not be read or parsed, or None if there is no parser for the page's website.
+    """
+    host = urlparse(entry.url).netloc
+    if host.startswith('www.'):
+        host = host[4:]
+    scraper_class = SCRAPERS.get(host)
+    if scraper_class is None:
+        return None
+
+    try:
+        scraper = scraper_class(entry.url)
+        property_details = scraper.parse_property_details(_worker_archive.read(entry))
+    except Exception as err:
+        # One broken page must not abort the whole re-extraction
+        return None, None, f"{type(err).__name__}: {err}"
+
+    # The page reflects the listing at fetch time, not at re-extraction time
+    property_details.pop('created_at', None)
+    property_details['last_checked_at'] = entry.fetched_at
+    return getattr(scraper, 'listing_id', None), property_details, None
+
+
+def reextract(directory: str, workers: int = None, latest_only: bool = True,
+              failures: Optional[List[Tuple[str, str]]] = None) -> Iterator[Tuple[Optional[int], Dict]]:
+    """
+    Reruns the parsers over the archive in a pool of worker processes.
+    Yields (listing_id, property_details) in index order. Pages that fail are skipped
+    and, if a `failures` list is given, appended to it as (url, error).
+    """
+    # Imported here so that worker processes importing this module do not load it again
+    from concurrent.futures import ProcessPoolExecutor
+
+    entries = list(PageArchive(directory).entries(latest_only=latest_only))
+    if not entries:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(entries) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(directory,)) as pool:
+        for entry, result in zip(entries, pool.map(reextract_entry, entries, chunksize=chunksize)):
+            if result is None:
+                continue
+            listing_id, property_details, error = result
+            if error is not None:
+                if failures is not None:
+                    failures.append((entry.url, error))
+                continue
+            yield listing_id, property_details
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-extract property details from archived pages')
+    parser.add_argument('--archive-dir', required=True, help='Page archive directory')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--all-fetches', action='store_true',
+                        help='Parse every archived fetch instead of only the latest page per URL')
+    parser.add_argument('--output', help='Write JSON lines to this file (default: stdout)')
+    parser.add_argument('--update-db', action='store_true',
+                        help='Backfill description, rooms, area and floor of LISTING rows not checked since the '
+                             'page was fetched; prices are left to the scraper')
+    parser.add_argument('--db-host', default='localhost', help='Database host (default: localhost)')
+    parser.add_argument('--db-port', type=int, default=3306, help='Database port (default: 3306)')
+    parser.add_argument('--db-user', default='user', help='Database user (default: user)')
+    parser.add_argument('--db-password', default='password', help='Database password')
+    parser.add_argument('--db-name', default='RC', help='Database name (default: RC)')
+
+    args = parser.parse_args()
+
+    db_handler = None
+    if args.update_db:
+        db_handler = DatabaseHandler(host=args.db_host, port=args.db_port, user=args.db_user,
+                                     password=args.db_password, database=args.db_name)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    count = 0
+    updated = 0
+    failures = []
+    try:
+        for listing_id, property_details in reextract(args.archive_dir, args.workers, not args.all_fetches,
+                                                      failures):
+            output.write(json.dumps(property_details, ensure_ascii=False, default=str) + '\n')
+            count += 1
+            if db_handler and listing_id and db_handler.backfill_listing_details(
+                    listing_id, property_details, property_details['last_checked_at']):
+                updated += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    for url, error in failures:
+        print(f"Failed to re-extract {url}: {error}", file=sys.stderr)
+    print(f"Re-extracted {count} pages, updated {updated} listings, {len(failures)} failed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import time
+import heapq
+import random
+import itertools
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Failure types that point at the source website rather than at a single listing
+HOST_FAILURE_TYPES = {'http_403', 'http_429', 'http_5xx', 'timeout', 'connection'}
+
+
+def classify_failure(error: Optional[BaseException]) -> str:
+    """
+    Maps a scraping failure to a short error type.
+    Used both for grouping error rows and for deciding whether the host is unhealthy.
+    """
+    if error is None:
+        return 'empty_page'
+
+    import requests
+
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status_code = error.response.status_code
+        if status_code in (403, 429):
+            return f'http_{status_code}'
+        if status_code >= 500:
+            return 'http_5xx'
+        return f'http_{status_code}'
+
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+
+    return 'exception'
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+    After `failure_threshold` consecutive host failures the host is paused for `cooldown`
+    seconds, then a single probe request is let through. Every consecutive trip doubles
+    the pause, up to `max_cooldown`.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0, max_cooldown: float = 900.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self._hosts: Dict[str, Dict] = {}
+
+    def _state(self, host: str) -> Dict:
+        return self._hosts.setdefault(host, {'failures': 0, 'trips': 0, 'open_until': None, 'probing': False})
+
+    def allow(self, host: str) -> bool:
+        """
+        Checks if a request to the host may be made right now.
+        Returns True if the circuit is closed or a half-open probe is due, False otherwise.
+        """
+        state = self._state(host)
+        if state['open_until'] is None:
+            return True
+        if state['probing'] or self.clock() < state['open_until']:
+            return False
+
+        # Cooldown is over, let a single probe request through
+        state['probing'] = True
+        return True
+
+    def reopens_at(self, host: str) -> Optional[float]:
+        """Returns the clock value at which the host gets a probe request, None if the circuit is closed."""
+        return self._state(host)['open_until']
+
+    def is_open(self, host: str) -> bool:
+        return self._state(host)['open_until'] is not None
+
+    def record_success(self, host: str) -> None:
+        """Closes the circuit for the host."""
+        self._hosts[host] = {'failures': 0, 'trips': 0, 'open_until': None, 'probing': False}
+
+    def record_failure(self, host: str) -> None:
+        """
+        Registers a host failure.
+        Opens the circuit once the threshold is reached or when a half-open probe fails.
+        """
+        state = self._state(host)
+        state['failures'] += 1
+
+        if state['probing'] or state['failures'] >= self.failure_threshold:
+            pause = min(self.cooldown * (2 ** state['trips']), self.max_cooldown)
+            state['trips'] += 1
+            state['open_until'] = self.clock() + pause
+            state['probing'] = False
+
+
+class RetryQueue:
+    """
+    Delayed-retry queue ordered by due time.
+    Delays grow exponentially with the attempt number and are jittered so that
+    deferred listings do not all hit the website at the same moment.
+    """
+
+    def __init__(self, base_delay: float = 5.0, max_delay: float = 300.0, max_attempts: int = 3,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def backoff(self, attempt: int) -> float:
+        """Returns a jittered delay in seconds for the given attempt number."""
+        delay = min(self.base_delay * (2 ** (attempt - 1)), self.max_delay)
+        return delay / 2 + self.rng.uniform(0, delay / 2)
+
+    def push(self, url: str, attempt: int, not_before: Optional[float] = None) -> bool:
+        """
+        Schedules a retry of the url.
+        Returns True if the retry was queued, False if the attempts are exhausted.
+        """
+        if attempt > self.max_attempts:
+            return False
+
+        due = self.clock() + self.backoff(attempt)
+        if not_before is not None:
+            due = max(due, not_before + self.rng.uniform(0, self.base_delay))
+
+        heapq.heappush(self._heap, (due, next(self._counter), url, attempt))
+        return True
+
+    def next_due(self) -> Optional[float]:
+        """Returns the clock value at which the next retry is due, None if the queue is empty."""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self) -> List[Tuple[str, int]]:
+        """Removes and returns all (url, attempt) pairs that are due."""
+        now = self.clock()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, url, attempt = heapq.heappop(self._heap)
+            due.append((url, attempt))
+        return due
+
+
+class ErrorAggregator:
+    """
+    Collects scraping errors during a run and writes them in batches grouped by error type.
+    Only the latest error per url is kept, so a listing that succeeds on retry leaves no error row.
+    """
+
+    def __init__(self):
+        self._errors: Dict[str, Tuple[int, str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._errors)
+
+    def add(self, url: str, listing_id: int, error_type: str, message: str) -> None:
+        self._errors[url] = (listing_id, error_type, message)
+
+    def discard(self, url: str) -> None:
+        self._errors.pop(url, None)
+
+    def error_type(self, url: str) -> Optional[str]:
+        """Returns the type of the latest error recorded for the url, None if there is none."""
+        error = self._errors.get(url)
+        return error[1] if error else None
+
+    def grouped(self) -> Dict[str, List[Tuple[int, str]]]:
+        """Returns the collected errors as {error_type: [(listing_id, message), ...]}."""
+        groups: Dict[str, List[Tuple[int, str]]] = {}
+        for listing_id, error_type, message in self._errors.values():
+            groups.setdefault(error_type, []).append((listing_id, f"[{error_type}] {message}"))
+        return groups
+
+    def flush(self, db_handler) -> int:
+        """
+        Writes the collected errors with one batched insert per error type.
+        Groups that could not be written are kept, so the caller can report or retry them.
+        Returns the number of error rows written.
+        """
+        written = 0
+        for error_type, rows in self.grouped().items():
+            if db_handler.log_scraping_errors(rows):
+                written += len(rows)
+                self._errors = {url: error for url, error in self._errors.items() if error[1] != error_type}
+        return written
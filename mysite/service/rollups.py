@@ -0,0 +1,81 @@
+import datetime
+from typing import Dict
+
+# Rollup bucket sizes, each mapped to the SQL expression of the bucket start date
+BUCKETS = ('day', 'week')
+
+BUCKET_START_SQL = {
+    'day': 'DATE({column})',
+    'week': 'DATE_SUB(DATE({column}), INTERVAL WEEKDAY({column}) DAY)',
+}
+
+# Days of rollup buckets the periodic maintenance rebuilds from raw price history
+COMPACTION_DAYS = 2
+
+
+def bucket_start(recorded_at: datetime.datetime, bucket: str) -> datetime.date:
+    """
+    Returns the first day of the bucket the timestamp falls into.
+    Weekly buckets start on Monday, same as MySQL WEEKDAY().
+    """
+    day = recorded_at.date() if isinstance(recorded_at, datetime.datetime) else recorded_at
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    raise ValueError(f"Unknown rollup bucket: {bucket}")
+
+
+def bucket_start_sql(bucket: str, column: str = 'RECORDED_AT') -> str:
+    """Returns the SQL expression computing the bucket start of a datetime column."""
+    if bucket not in BUCKET_START_SQL:
+        raise ValueError(f"Unknown rollup bucket: {bucket}")
+    return BUCKET_START_SQL[bucket].format(column=column)
+
+
+def validate_retention(raw_retention_days: int, daily_retention_days: int,
+                       compaction_days: int = COMPACTION_DAYS) -> None:
+    """
+    Checks the retention settings against the compaction window.
+    Raw rows inside the window must still be complete, so the raw retention has to cover
+    the window plus a whole week bucket, and rebuilt daily buckets must not be dropped right away.
+    Raises ValueError if the settings are inconsistent.
+    """
+    if raw_retention_days <= compaction_days + 7:
+        raise ValueError(f"raw retention must be more than {compaction_days + 7} days")
+    if daily_retention_days <= compaction_days:
+        raise ValueError(f"daily rollup retention must be more than {compaction_days} days")
+
+
+def earliest_rebuild_start(raw_retention_days: int, daily_retention_days: int,
+                           now: datetime.datetime = None) -> datetime.datetime:
+    """
+    Returns the earliest date rollups can be rebuilt from without losing data.
+    Raw rows older than the raw retention are thinned to one price per day, so rebuilding
+    from them would undercount weekly buckets, and daily buckets older than the daily
+    retention would be recreated only to be dropped again.
+    """
+    now = now or datetime.datetime.now()
+    cutoff = (now - datetime.timedelta(days=min(raw_retention_days, daily_retention_days))).date()
+    # Rebuilds start at a whole week bucket, so round up to the next Monday
+    first_week = cutoff + datetime.timedelta(days=(7 - cutoff.weekday()) % 7)
+    return datetime.datetime.combine(first_week, datetime.time.min)
+
+
+def compact_and_prune(db_handler, compaction_days: int = COMPACTION_DAYS, raw_retention_days: int = 90,
+                      daily_retention_days: int = 365, now: datetime.datetime = None) -> Dict[str, bool]:
+    """
+    Periodic rollup maintenance.
+    Rebuilds the rollup buckets of the last `compaction_days` from PRICE_HISTORY, then
+    thins raw price rows older than `raw_retention_days` to the last price of each day
+    and drops daily buckets older than `daily_retention_days`. Weekly buckets are kept.
+    """
+    validate_retention(raw_retention_days, daily_retention_days, compaction_days)
+
+    now = now or datetime.datetime.now()
+    compacted = db_handler.compact_price_rollups(now - datetime.timedelta(days=compaction_days))
+    pruned = db_handler.prune_price_history(
+        raw_before=now - datetime.timedelta(days=raw_retention_days),
+        daily_before=bucket_start(now - datetime.timedelta(days=daily_retention_days), 'day')
+    )
+    return {'compacted': compacted, 'pruned': pruned}
@@ -3,22 +3,30 @@ import schedule
 import argparse
 import datetime
 import logging
-from typing import List, Dict
-
-from mysite.scrapers.rieltorua import scrape_and_update_listing
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("scraper.log"),
-        logging.StreamHandler()
-    ]
-)
+from typing import List, Dict, Optional
+from urllib.parse import urlparse
+
+from mysite.scrapers.rieltorua import RieltorScraper, scrape_and_update_listing
+from mysite.service.databasehandler import DatabaseHandler
+from mysite.service.pagearchive import PageArchive
+from mysite.service.resilience import CircuitBreaker, RetryQueue, ErrorAggregator, HOST_FAILURE_TYPES
+from mysite.service.rollups import compact_and_prune, earliest_rebuild_start, validate_retention
+
 logger = logging.getLogger("rieltor_scraper")
 
 
+def setup_logging():
+    """Configure logging to scraper.log and the console, done in main() so importing has no side effects"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("scraper.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+
 def setup_db_config(args):
     """Create database configuration from command line arguments"""
     return {
@@ -30,26 +38,112 @@ def setup_db_config(args):
     }
 
 
-def scrape_listings(urls: List[str], db_config: Dict):
+def scrape_one(url: str, attempt: int, db_config: Dict, breaker: CircuitBreaker,
+               retry_queue: RetryQueue, errors: ErrorAggregator, archive: PageArchive = None) -> Optional[bool]:
+    """
+    Scrape a single listing unless its host is paused by the circuit breaker.
+    Host failures are rescheduled on the retry queue.
+    Returns True/False for the scrape result, None if no request was made.
+    """
+    host = urlparse(url).netloc
+
+    if not breaker.allow(host):
+        # Source is paused, defer the listing until the breaker lets a probe through
+        if not retry_queue.push(url, attempt + 1, not_before=breaker.reopens_at(host)):
+            errors.add(url, RieltorScraper.extract_listing_id(url), 'circuit_open',
+                       f"Source {host} unavailable, gave up on {url}")
+        return None
+
+    logger.info(f"Scraping {url}" + (f" (attempt {attempt})" if attempt > 1 else ""))
+    result = scrape_and_update_listing(url, db_config, errors=errors, archive=archive)
+
+    if not result and errors.error_type(url) in HOST_FAILURE_TYPES:
+        breaker.record_failure(host)
+        if breaker.is_open(host):
+            logger.warning(f"Circuit open for {host}, pausing requests until cooldown ends")
+        retry_queue.push(url, attempt + 1)
+    else:
+        # The source responded, even if this particular page could not be parsed
+        breaker.record_success(host)
+    return result
+
+
+def scrape_listings(urls: List[str], db_config: Dict, breaker: CircuitBreaker = None,
+                    retry_queue: RetryQueue = None, request_delay: float = 2, archive: PageArchive = None):
     """Scrape all listings in the list"""
     logger.info(f"Starting scraping of {len(urls)} listings at {datetime.datetime.now()}")
 
+    # RetryQueue defines __len__, so an empty queue is falsy and must not be replaced by `or`
+    if breaker is None:
+        breaker = CircuitBreaker()
+    if retry_queue is None:
+        retry_queue = RetryQueue()
+    errors = ErrorAggregator()
+
     success_count = 0
-    for url in urls:
+    pending = [(url, 1) for url in urls]
+    while pending or retry_queue:
+        if not pending:
+            # Wait for the next delayed retry to become due
+            wait = retry_queue.next_due() - retry_queue.clock()
+            if wait > 0:
+                time.sleep(wait)
+            pending = retry_queue.pop_due()
+            continue
+
+        url, attempt = pending.pop(0)
         try:
-            logger.info(f"Scraping {url}")
-            result = scrape_and_update_listing(url, db_config)
+            result = scrape_one(url, attempt, db_config, breaker, retry_queue, errors, archive)
             if result:
                 success_count += 1
-            # Sleep between requests to avoid overloading the server
-            time.sleep(2)
+            if result is not None:
+                # Sleep between requests to avoid overloading the server
+                time.sleep(request_delay)
         except Exception as e:
             logger.error(f"Error scraping {url}: {e}")
 
+    if errors:
+        written = errors.flush(DatabaseHandler(**db_config))
+        logger.info(f"Logged {written} scraping errors")
+        for error_type, rows in errors.grouped().items():
+            logger.error(f"Failed to log {len(rows)} '{error_type}' scraping errors: "
+                         f"{', '.join(str(listing_id) for listing_id, _ in rows)}")
+
     logger.info(f"Completed scraping. {success_count}/{len(urls)} successful.")
 
 
+def maintain_rollups(db_config: Dict, raw_retention_days: int, daily_retention_days: int):
+    """Rebuild recent price rollups and apply raw price history retention"""
+    try:
+        result = compact_and_prune(DatabaseHandler(**db_config), raw_retention_days=raw_retention_days,
+                                   daily_retention_days=daily_retention_days)
+        logger.info(f"Price rollup maintenance finished: {result}")
+    except Exception as e:
+        # A failed maintenance run must not stop the scheduler, the next run rebuilds the same window
+        logger.error(f"Error maintaining price rollups: {e}")
+
+
+def rebuild_rollups(db_config: Dict, since: datetime.date, raw_retention_days: int, daily_retention_days: int,
+                    force: bool = False, now: datetime.datetime = None):
+    """
+    Roll up all price history recorded since the given date, used to backfill existing history.
+    Without force, the start is clamped to the retention window so thinned history is not rebuilt.
+    """
+    since = datetime.datetime.combine(since, datetime.time.min)
+    earliest = earliest_rebuild_start(raw_retention_days, daily_retention_days, now)
+    if since < earliest and not force:
+        logger.warning(f"Price history before {earliest.date()} is already thinned, "
+                       f"rebuilding rollups since {earliest.date()} instead of {since.date()}")
+        since = earliest
+    if DatabaseHandler(**db_config).compact_price_rollups(since):
+        logger.info(f"Rebuilt price rollups since {since.date()}")
+    else:
+        logger.error(f"Failed to rebuild price rollups since {since.date()}")
+
+
 def main():
+    setup_logging()
+
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Rieltor.ua periodic scraper')
     parser.add_argument('--urls', nargs='+', required=True, help='URLs to scrape')
@@ -59,16 +153,51 @@ def main():
     parser.add_argument('--db-user', default='user', help='Database user (default: user)')
     parser.add_argument('--db-password', default='password', help='Database password')
     parser.add_argument('--db-name', default='RC', help='Database name (default: RC)')
+    parser.add_argument('--failure-threshold', type=int, default=3,
+                        help='Consecutive failures before a source is paused (default: 3)')
+    parser.add_argument('--cooldown', type=float, default=60,
+                        help='Seconds a failing source is paused for (default: 60)')
+    parser.add_argument('--max-retries', type=int, default=3,
+                        help='Delayed retries per listing after a source failure (default: 3)')
+    parser.add_argument('--archive-dir', help='Keep compressed raw HTML of fetched pages in this directory')
+    parser.add_argument('--raw-retention-days', type=int, default=90,
+                        help='Days of full raw price history kept before thinning (default: 90)')
+    parser.add_argument('--daily-retention-days', type=int, default=365,
+                        help='Days of daily price rollups kept, weekly rollups are kept forever (default: 365)')
+    parser.add_argument('--rebuild-rollups-since', type=datetime.date.fromisoformat, metavar='YYYY-MM-DD',
+                        help='Rebuild price rollups from all price history since this date before scraping, '
+                             'clamped to the raw and daily retention windows')
+    parser.add_argument('--force-rollup-rebuild', action='store_true',
+                        help='Rebuild from --rebuild-rollups-since even if it is older than the retention windows')
 
     args = parser.parse_args()
 
+    try:
+        validate_retention(args.raw_retention_days, args.daily_retention_days)
+    except ValueError as e:
+        parser.error(str(e))
+
     db_config = setup_db_config(args)
 
+    if args.rebuild_rollups_since:
+        rebuild_rollups(db_config, args.rebuild_rollups_since, args.raw_retention_days,
+                        args.daily_retention_days, force=args.force_rollup_rebuild)
+
+    # Breaker state is kept across runs so a source that is still down stays paused
+    breaker = CircuitBreaker(failure_threshold=args.failure_threshold, cooldown=args.cooldown)
+    archive = PageArchive(args.archive_dir) if args.archive_dir else None
+
+    def run():
+        scrape_listings(args.urls, db_config, breaker=breaker,
+                        retry_queue=RetryQueue(max_attempts=args.max_retries + 1), archive=archive)
+
     # Run immediately once
-    scrape_listings(args.urls, db_config)
+    run()
 
     # Schedule periodic runs
-    schedule.every(args.interval).hours.do(scrape_listings, args.urls, db_config)
+    schedule.every(args.interval).hours.do(run)
+    schedule.every().day.at("03:00").do(maintain_rollups, db_config,
+                                        args.raw_retention_days, args.daily_retention_days)
 
     logger.info(f"Scheduler set up to run every {args.interval} hours")
 
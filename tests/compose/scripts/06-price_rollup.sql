@@ -0,0 +1,28 @@
+CREATE TABLE IF NOT EXISTS PRICE_ROLLUP_LISTING(
+    LISTING_ID INT NOT NULL,
+    BUCKET VARCHAR(10) NOT NULL,
+    BUCKET_START DATE NOT NULL,
+    MIN_PRICE INT,
+    MAX_PRICE INT,
+    LAST_PRICE INT,
+    LAST_RECORDED_AT DATETIME,
+    PRICE_COUNT INT NOT NULL,
+
+    PRIMARY KEY (LISTING_ID, BUCKET, BUCKET_START),
+    FOREIGN KEY (LISTING_ID) references LISTING(ID)
+);
+
+CREATE TABLE IF NOT EXISTS PRICE_ROLLUP_SEGMENT(
+    SOURCE_WEBSITE VARCHAR(100) NOT NULL,
+    NUMBER_OF_ROOMS INT NOT NULL,
+    BUCKET VARCHAR(10) NOT NULL,
+    BUCKET_START DATE NOT NULL,
+    MIN_PRICE INT,
+    MAX_PRICE INT,
+    LAST_PRICE INT,
+    LAST_RECORDED_AT DATETIME,
+    PRICE_COUNT INT NOT NULL,
+    PRICE_SUM BIGINT NOT NULL,
+
+    PRIMARY KEY (SOURCE_WEBSITE, NUMBER_OF_ROOMS, BUCKET, BUCKET_START)
+);
\ No newline at end of file
@@ -0,0 +1,61 @@
+import os
+import sys
+import subprocess
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative `python -X importtime` budget of the modules short-lived workers and CLIs start from.
+# Unloaded they import in ~15 ms, loading bs4/requests/mysql eagerly costs well over 100 ms; the margin
+# keeps loaded CI machines green. Set IMPORT_TIME_BUDGET_MS to check a tighter budget locally.
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', 150))
+
+# Heavy dependencies that must only be imported when they are actually used
+LAZY_MODULES = ('mysql', 'bs4', 'flask', 'requests', 'zstandard', 'concurrent')
+
+ENTRY_MODULES = (
+    'mysite.scrapers.rieltorua',
+    'mysite.scrapers.scraperDomRiaScraper',
+    'mysite.service.reextract',
+    'mysite.service.scheduler',
+)
+
+
+def import_times(module: str, cwd: str = REPO_ROOT) -> dict:
+    """Imports the module in a fresh interpreter and returns {module name: cumulative microseconds}."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    def test_entry_modules_do_not_load_heavy_dependencies(self):
+        for module in ENTRY_MODULES:
+            with self.subTest(module=module):
+                loaded = import_times(module)
+                heavy = sorted(name for name in loaded if name.split('.')[0] in LAZY_MODULES)
+                self.assertEqual(heavy, [])
+
+    def test_entry_modules_import_within_budget(self):
+        for module in ENTRY_MODULES:
+            with self.subTest(module=module):
+                # Best of three, the first run may also pay for writing .pyc files
+                best_us = min(import_times(module)[module] for _ in range(3))
+                self.assertLessEqual(best_us / 1000, IMPORT_TIME_BUDGET_MS)
+
+    def test_scheduler_import_has_no_side_effects(self):
+        with tempfile.TemporaryDirectory() as directory:
+            import_times('mysite.service.scheduler', cwd=directory)
+            self.assertEqual(os.listdir(directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
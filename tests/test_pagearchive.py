@@ -0,0 +1,174 @@
+import os
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+from mysite.service.databasehandler import DatabaseHandler
+from mysite.service.pagearchive import PageArchive
+from mysite.service.reextract import reextract
+
+LISTING_PAGE = """
+<html><body>
+<div class="offer-view-price">{price} грн/міс</div>
+<div class="offer-view-section-text">Затишна квартира біля метро, номер {number}</div>
+<div class="offer-view-details-row"><span>2 кімнати</span></div>
+<div class="offer-view-details-row"><span>поверх 3 з 9</span></div>
+<div class="offer-view-details-row"><span>55 / 25 / 15 м²</span></div>
+</body></html>
+"""
+
+
+def listing_url(number):
+    return f'https://rieltor.ua/flats-rent/view/{number}/'
+
+
+class FakeCursor:
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+        self.executed = []
+
+    def execute(self, query, values):
+        self.executed.append((query, values))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PageArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_store_and_read(self):
+        archive = PageArchive(self.directory)
+        html = LISTING_PAGE.format(price=15000, number=1)
+        entry = archive.store(listing_url(1), html)
+
+        self.assertEqual(archive.read(entry), html)
+        self.assertEqual(PageArchive(self.directory).read(entry), html)
+
+    def test_identical_pages_are_stored_once(self):
+        archive = PageArchive(self.directory)
+        html = LISTING_PAGE.format(price=15000, number=1)
+        first = archive.store(listing_url(1), html, fetched_at=datetime.datetime(2025, 1, 1))
+        second = archive.store(listing_url(1), html, fetched_at=datetime.datetime(2025, 1, 2))
+
+        self.assertEqual((first.segment, first.offset), (second.segment, second.offset))
+        self.assertEqual(len(list(archive.entries(latest_only=False))), 2)
+        latest = list(PageArchive(self.directory).entries())
+        self.assertEqual([entry.fetched_at for entry in latest], [datetime.datetime(2025, 1, 2)])
+
+    def test_torn_index_line_is_skipped(self):
+        archive = PageArchive(self.directory)
+        first = archive.store(listing_url(1), LISTING_PAGE.format(price=15000, number=1))
+        with open(os.path.join(self.directory, PageArchive.INDEX_FILE), 'a', encoding='utf-8') as index_file:
+            index_file.write(first.to_line()[:20])
+
+        reopened = PageArchive(self.directory)
+        self.assertEqual([entry.url for entry in reopened.entries()], [listing_url(1)])
+        second = reopened.store(listing_url(2), LISTING_PAGE.format(price=16000, number=2))
+
+        entries = list(PageArchive(self.directory).entries())
+        self.assertEqual([entry.url for entry in entries], [listing_url(1), listing_url(2)])
+        self.assertEqual(reopened.read(entries[-1]), LISTING_PAGE.format(price=16000, number=2))
+        self.assertEqual(entries[-1].offset, second.offset)
+
+    def test_segments_roll_over(self):
+        archive = PageArchive(self.directory, segment_size=200)
+        entries = [archive.store(listing_url(n), LISTING_PAGE.format(price=n, number=n)) for n in range(5)]
+
+        self.assertGreater(len(os.listdir(os.path.join(self.directory, PageArchive.SEGMENTS_DIR))), 1)
+        for n, entry in enumerate(entries):
+            self.assertEqual(archive.read(entry), LISTING_PAGE.format(price=n, number=n))
+
+    def test_dictionary_is_trained_and_used(self):
+        archive = PageArchive(self.directory, train_after=100, dict_size=4096)
+        entries = [archive.store(listing_url(n), LISTING_PAGE.format(price=10000 + n, number=n))
+                   for n in range(150)]
+
+        self.assertEqual(entries[0].dict_id, 0)
+        self.assertNotEqual(entries[-1].dict_id, 0)
+        self.assertLess(entries[-1].length, entries[0].length)
+
+        reopened = PageArchive(self.directory)
+        self.assertEqual(reopened.read(entries[-1]), LISTING_PAGE.format(price=10149, number=149))
+        self.assertEqual(reopened.store(listing_url(1000), LISTING_PAGE.format(price=1, number=1000)).dict_id,
+                         entries[-1].dict_id)
+
+
+class ReextractTestCase(unittest.TestCase):
+    def test_reextract_parses_archived_pages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = PageArchive(directory)
+            fetched_at = datetime.datetime(2025, 1, 1, 12)
+            for n in range(1, 4):
+                archive.store(listing_url(n), LISTING_PAGE.format(price=15000 + n, number=n), fetched_at)
+
+            results = sorted(reextract(directory, workers=2))
+
+        self.assertEqual([listing_id for listing_id, _ in results], [1, 2, 3])
+        listing_id, details = results[0]
+        self.assertEqual(details['original_price'], 15001)
+        self.assertEqual(details['number_of_rooms'], 2)
+        self.assertEqual(details['floor'], 3)
+        self.assertEqual(details['total_area'], 55.0)
+        self.assertEqual(details['last_checked_at'], fetched_at)
+        self.assertNotIn('created_at', details)
+
+    def test_reextract_reports_unreadable_pages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = PageArchive(directory)
+            for n in range(1, 4):
+                archive.store(listing_url(n), LISTING_PAGE.format(price=15000 + n, number=n))
+            # Corrupt the blob of the second page
+            broken = list(archive.entries())[1]
+            segment_path = os.path.join(directory, PageArchive.SEGMENTS_DIR, f'{broken.segment:08d}.seg')
+            with open(segment_path, 'r+b') as segment_file:
+                segment_file.seek(broken.offset)
+                segment_file.write(b'\0' * broken.length)
+
+            failures = []
+            results = list(reextract(directory, workers=2, failures=failures))
+
+        self.assertEqual(sorted(listing_id for listing_id, _ in results), [1, 3])
+        self.assertEqual([url for url, _ in failures], [listing_url(2)])
+
+    def test_backfill_only_updates_parsed_fields_of_older_rows(self):
+        cursor = FakeCursor(rowcount=0)
+        fetched_at = datetime.datetime(2025, 1, 1, 12)
+        details = {'description': 'Затишна квартира', 'number_of_rooms': 2, 'floor': 3, 'total_area': 55.0,
+                   'original_price': 15001, 'last_checked_at': fetched_at}
+        with mock.patch.object(DatabaseHandler, 'connect', return_value=FakeConnection(cursor)):
+            # A listing checked after the fetch matches no row
+            self.assertFalse(DatabaseHandler().backfill_listing_details(1, details, fetched_at))
+
+        (query, values), = cursor.executed
+        self.assertIn('LAST_CHECKED_AT <= %s', query)
+        self.assertNotIn('ORIGINAL_PRICE', query)
+        self.assertNotIn('LAST_CHECKED_AT =', query)
+        self.assertEqual(values, ['Затишна квартира', 2, 55.0, 3, 1, fetched_at])
+
+
+if __name__ == '__main__':
+    unittest.main()
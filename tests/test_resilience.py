@@ -0,0 +1,272 @@
+import random
+import unittest
+from collections import Counter
+from unittest import mock
+
+import mysql.connector
+import requests
+
+from mysite.service import scheduler
+from mysite.service.databasehandler import DatabaseHandler
+from mysite.service.resilience import CircuitBreaker, RetryQueue, ErrorAggregator, classify_failure
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSleep:
+    def __init__(self, clock):
+        self.clock = clock
+
+    def __call__(self, seconds):
+        self.clock.now += seconds
+
+
+class FakeDatabaseHandler:
+    def __init__(self, failing=(), **db_config):
+        self.failing = failing
+        self.batches = []
+
+    def log_scraping_errors(self, errors):
+        if any(error_message.startswith(tuple(f'[{error_type}]' for error_type in self.failing))
+               for _, error_message in errors):
+            return False
+        self.batches.append(errors)
+        return True
+
+
+class FakeErrorCursor:
+    def __init__(self, listing_ids, bad_listing_id=None):
+        self.listing_ids = listing_ids
+        self.bad_listing_id = bad_listing_id
+        self.inserted = []
+        self.result = None
+
+    def execute(self, query, values=None):
+        if query.strip().startswith('SELECT ID FROM LISTING'):
+            self.result = [(listing_id,) for listing_id in values if listing_id in self.listing_ids]
+        elif query.strip().startswith('SELECT MAX(ID)'):
+            self.result = [(10,)]
+        else:
+            if values[1] == self.bad_listing_id:
+                raise mysql.connector.Error("Cannot add or update a child row")
+            self.inserted.append(values)
+
+    def executemany(self, query, rows):
+        if any(row[1] == self.bad_listing_id for row in rows):
+            raise mysql.connector.Error("Cannot add or update a child row")
+        self.inserted.extend(rows)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeErrorConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+class ClassifyFailureTestCase(unittest.TestCase):
+    def test_http_errors(self):
+        self.assertEqual(classify_failure(http_error(403)), 'http_403')
+        self.assertEqual(classify_failure(http_error(429)), 'http_429')
+        self.assertEqual(classify_failure(http_error(503)), 'http_5xx')
+        self.assertEqual(classify_failure(http_error(404)), 'http_404')
+
+    def test_network_errors(self):
+        self.assertEqual(classify_failure(requests.exceptions.ReadTimeout()), 'timeout')
+        self.assertEqual(classify_failure(requests.exceptions.ConnectionError()), 'connection')
+        self.assertEqual(classify_failure(None), 'empty_page')
+        self.assertEqual(classify_failure(ValueError()), 'exception')
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, cooldown=60, clock=self.clock)
+
+    def test_opens_after_threshold(self):
+        for _ in range(2):
+            self.breaker.record_failure('rieltor.ua')
+        self.assertTrue(self.breaker.allow('rieltor.ua'))
+
+        self.breaker.record_failure('rieltor.ua')
+        self.assertFalse(self.breaker.allow('rieltor.ua'))
+        self.assertTrue(self.breaker.allow('dom.ria.com'))
+
+    def test_single_probe_after_cooldown(self):
+        for _ in range(3):
+            self.breaker.record_failure('rieltor.ua')
+
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow('rieltor.ua'))
+        self.assertFalse(self.breaker.allow('rieltor.ua'))
+
+        self.breaker.record_success('rieltor.ua')
+        self.assertTrue(self.breaker.allow('rieltor.ua'))
+
+    def test_failed_probe_doubles_cooldown(self):
+        for _ in range(3):
+            self.breaker.record_failure('rieltor.ua')
+
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow('rieltor.ua'))
+        self.breaker.record_failure('rieltor.ua')
+        self.assertEqual(self.breaker.reopens_at('rieltor.ua'), 180)
+
+
+class RetryQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.queue = RetryQueue(base_delay=10, max_attempts=3, clock=self.clock, rng=random.Random(1))
+
+    def test_backoff_is_jittered_and_growing(self):
+        for attempt in (1, 2, 3):
+            delay = self.queue.backoff(attempt)
+            full = 10 * 2 ** (attempt - 1)
+            self.assertGreaterEqual(delay, full / 2)
+            self.assertLessEqual(delay, full)
+
+    def test_pop_due_in_order(self):
+        self.queue.push('https://rieltor.ua/flats-rent/view/2/', 2)
+        self.queue.push('https://rieltor.ua/flats-rent/view/1/', 1)
+        self.assertEqual(self.queue.pop_due(), [])
+
+        self.clock.now = 20
+        self.assertEqual(self.queue.pop_due(), [
+            ('https://rieltor.ua/flats-rent/view/1/', 1),
+            ('https://rieltor.ua/flats-rent/view/2/', 2),
+        ])
+        self.assertEqual(len(self.queue), 0)
+
+    def test_not_before_and_exhausted_attempts(self):
+        self.assertTrue(self.queue.push('https://rieltor.ua/flats-rent/view/1/', 1, not_before=100))
+        self.assertGreaterEqual(self.queue.next_due(), 100)
+        self.assertFalse(self.queue.push('https://rieltor.ua/flats-rent/view/1/', 4))
+
+
+class ErrorAggregatorTestCase(unittest.TestCase):
+    def test_flush_groups_by_error_type(self):
+        errors = ErrorAggregator()
+        errors.add('https://rieltor.ua/flats-rent/view/1/', 1, 'http_429', 'Too many requests')
+        errors.add('https://rieltor.ua/flats-rent/view/2/', 2, 'http_429', 'Too many requests')
+        errors.add('https://rieltor.ua/flats-rent/view/3/', 3, 'timeout', 'Read timed out')
+        errors.add('https://rieltor.ua/flats-rent/view/4/', 4, 'timeout', 'Read timed out')
+        errors.discard('https://rieltor.ua/flats-rent/view/4/')
+
+        db_handler = FakeDatabaseHandler()
+        self.assertEqual(errors.flush(db_handler), 3)
+        self.assertEqual(len(db_handler.batches), 2)
+        self.assertIn([(1, '[http_429] Too many requests'), (2, '[http_429] Too many requests')],
+                      db_handler.batches)
+        self.assertEqual(len(errors), 0)
+
+    def test_failed_groups_are_kept(self):
+        errors = ErrorAggregator()
+        errors.add('https://rieltor.ua/flats-rent/view/1/', 1, 'circuit_open', 'rieltor.ua paused')
+        errors.add('https://rieltor.ua/flats-rent/view/2/', 2, 'circuit_open', 'rieltor.ua paused')
+        errors.add('https://rieltor.ua/flats-rent/view/3/', 3, 'timeout', 'Read timed out')
+
+        self.assertEqual(errors.flush(FakeDatabaseHandler(failing=('circuit_open',))), 1)
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(list(errors.grouped()), ['circuit_open'])
+
+        # The kept group is written by the next successful flush
+        self.assertEqual(errors.flush(FakeDatabaseHandler()), 2)
+        self.assertEqual(len(errors), 0)
+
+
+class LogScrapingErrorsTestCase(unittest.TestCase):
+    def log(self, cursor, errors):
+        with mock.patch.object(DatabaseHandler, 'connect', return_value=FakeErrorConnection(cursor)):
+            return DatabaseHandler().log_scraping_errors(errors)
+
+    def test_errors_of_unknown_listings_are_skipped(self):
+        cursor = FakeErrorCursor(listing_ids={1, 2})
+        self.assertTrue(self.log(cursor, [(1, 'a'), (0, 'b'), (2, 'c'), (99, 'd')]))
+        self.assertEqual([row[1:3] for row in cursor.inserted], [(1, 'a'), (2, 'c')])
+
+    def test_failed_batch_falls_back_to_single_rows(self):
+        cursor = FakeErrorCursor(listing_ids={1, 2, 3}, bad_listing_id=2)
+        self.assertFalse(self.log(cursor, [(1, 'a'), (2, 'b'), (3, 'c')]))
+        self.assertEqual([row[1:3] for row in cursor.inserted], [(1, 'a'), (3, 'c')])
+
+
+class ScrapeListingsOutageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.requests = Counter()
+        self.db_handlers = []
+
+    def fake_scrape(self, url, db_config, errors=None, archive=None):
+        self.requests[url] += 1
+        errors.add(url, 1, 'http_429', 'Too many requests')
+        return False
+
+    def fake_db_handler(self, **db_config):
+        db_handler = FakeDatabaseHandler()
+        self.db_handlers.append(db_handler)
+        return db_handler
+
+    def run_outage(self, urls, breaker, retry_queue):
+        with mock.patch.object(scheduler, 'scrape_and_update_listing', self.fake_scrape), \
+                mock.patch.object(scheduler, 'DatabaseHandler', self.fake_db_handler), \
+                mock.patch.object(scheduler, 'time', mock.Mock(sleep=FakeSleep(self.clock))):
+            scheduler.scrape_listings(urls, {}, breaker=breaker, retry_queue=retry_queue)
+
+    def test_injected_retry_queue_limits_attempts(self):
+        urls = [f'https://rieltor.ua/flats-rent/view/{n}/' for n in range(5)]
+        breaker = CircuitBreaker(failure_threshold=100, clock=self.clock)
+        retry_queue = RetryQueue(max_attempts=2, clock=self.clock, rng=random.Random(1))
+        self.run_outage(urls, breaker, retry_queue)
+
+        self.assertEqual(self.requests, Counter({url: 2 for url in urls}))
+        self.assertEqual(len(retry_queue), 0)
+        self.assertGreater(self.clock.now, 0)
+
+    def test_outage_pauses_the_source(self):
+        urls = [f'https://rieltor.ua/flats-rent/view/{n}/' for n in range(200)]
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=60, clock=self.clock)
+        retry_queue = RetryQueue(max_attempts=3, clock=self.clock, rng=random.Random(1))
+        self.run_outage(urls, breaker, retry_queue)
+
+        self.assertLess(sum(self.requests.values()), 20)
+        self.assertTrue(all(count <= 3 for count in self.requests.values()))
+        logged = sum(len(rows) for db_handler in self.db_handlers for rows in db_handler.batches)
+        self.assertEqual(logged, len(urls))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import datetime
+import unittest
+from unittest import mock
+
+from mysite.service import scheduler
+from mysite.service.databasehandler import DatabaseHandler
+from mysite.service.rollups import (bucket_start, bucket_start_sql, compact_and_prune, earliest_rebuild_start,
+                                    validate_retention)
+
+
+class FakeCursor:
+    def __init__(self, listing):
+        self.listing = listing
+        self.batches = []
+
+    def executemany(self, query, rows):
+        self.batches.append((query, rows))
+
+    def execute(self, query, values):
+        pass
+
+    def fetchone(self):
+        return self.listing
+
+
+class FakeDatabaseHandler:
+    def __init__(self):
+        self.calls = []
+
+    def compact_price_rollups(self, since):
+        self.calls.append(('compact', since))
+        return True
+
+    def prune_price_history(self, raw_before, daily_before):
+        self.calls.append(('prune', raw_before, daily_before))
+        return True
+
+
+class BucketTestCase(unittest.TestCase):
+    def test_bucket_start(self):
+        # 2025-01-08 is a Wednesday
+        recorded_at = datetime.datetime(2025, 1, 8, 17, 30)
+        self.assertEqual(bucket_start(recorded_at, 'day'), datetime.date(2025, 1, 8))
+        self.assertEqual(bucket_start(recorded_at, 'week'), datetime.date(2025, 1, 6))
+        self.assertEqual(bucket_start(datetime.date(2025, 1, 6), 'week'), datetime.date(2025, 1, 6))
+        with self.assertRaises(ValueError):
+            bucket_start(recorded_at, 'month')
+
+    def test_bucket_start_sql(self):
+        self.assertEqual(bucket_start_sql('day', 'ph.RECORDED_AT'), 'DATE(ph.RECORDED_AT)')
+        self.assertIn('WEEKDAY(RECORDED_AT)', bucket_start_sql('week'))
+
+
+class RollupMaintenanceTestCase(unittest.TestCase):
+    def test_update_price_rollups_writes_listing_and_segment_buckets(self):
+        cursor = FakeCursor(('rieltor.ua', 2))
+        recorded_at = datetime.datetime(2025, 1, 8, 17, 30)
+        DatabaseHandler()._update_price_rollups(cursor, 7, 15000, recorded_at)
+
+        (_, listing_rows), (_, segment_rows) = cursor.batches
+        self.assertEqual([row[1:3] for row in listing_rows], [
+            ('day', datetime.date(2025, 1, 8)),
+            ('week', datetime.date(2025, 1, 6)),
+        ])
+        self.assertEqual(segment_rows[0][:2], ('rieltor.ua', 2))
+        self.assertEqual(segment_rows[0][-2:], (1, 15000))
+
+    def test_update_price_rollups_skips_segment_of_unknown_listing(self):
+        cursor = FakeCursor(None)
+        DatabaseHandler()._update_price_rollups(cursor, 7, 15000, datetime.datetime(2025, 1, 8))
+        self.assertEqual(len(cursor.batches), 1)
+
+    def test_compact_and_prune(self):
+        db_handler = FakeDatabaseHandler()
+        now = datetime.datetime(2025, 6, 1, 3, 0)
+        result = compact_and_prune(db_handler, compaction_days=2, raw_retention_days=90,
+                                   daily_retention_days=365, now=now)
+
+        self.assertEqual(result, {'compacted': True, 'pruned': True})
+        self.assertEqual(db_handler.calls, [
+            ('compact', datetime.datetime(2025, 5, 30, 3, 0)),
+            ('prune', datetime.datetime(2025, 3, 3, 3, 0), datetime.date(2024, 6, 1)),
+        ])
+
+    def test_raw_retention_must_cover_compaction_window(self):
+        with self.assertRaises(ValueError):
+            compact_and_prune(FakeDatabaseHandler(), compaction_days=2, raw_retention_days=5)
+        with self.assertRaises(ValueError):
+            validate_retention(raw_retention_days=90, daily_retention_days=1)
+
+    def test_earliest_rebuild_start_is_a_week_inside_retention(self):
+        now = datetime.datetime(2025, 6, 1, 3, 0)
+        # Raw history is thinned before 2025-03-03, a Monday
+        self.assertEqual(earliest_rebuild_start(90, 365, now), datetime.datetime(2025, 3, 3))
+        self.assertEqual(earliest_rebuild_start(91, 365, now), datetime.datetime(2025, 3, 3))
+        self.assertEqual(earliest_rebuild_start(365, 30, now), datetime.datetime(2025, 5, 5))
+
+    def test_rebuild_is_clamped_to_retention_unless_forced(self):
+        db_handler = FakeDatabaseHandler()
+        now = datetime.datetime(2025, 6, 1, 3, 0)
+        with mock.patch.object(scheduler, 'DatabaseHandler', return_value=db_handler):
+            with self.assertLogs('rieltor_scraper', level='WARNING'):
+                scheduler.rebuild_rollups({}, datetime.date(2024, 1, 1), 90, 365, now=now)
+            scheduler.rebuild_rollups({}, datetime.date(2025, 4, 1), 90, 365, now=now)
+            scheduler.rebuild_rollups({}, datetime.date(2024, 1, 1), 90, 365, force=True, now=now)
+
+        self.assertEqual(db_handler.calls, [
+            ('compact', datetime.datetime(2025, 3, 3)),
+            ('compact', datetime.datetime(2025, 4, 1)),
+            ('compact', datetime.datetime(2024, 1, 1)),
+        ])
+
+    def test_maintenance_errors_do_not_stop_the_scheduler(self):
+        with mock.patch.object(scheduler, 'compact_and_prune', side_effect=ValueError("boom")), \
+                self.assertLogs('rieltor_scraper', level='ERROR'):
+            scheduler.maintain_rollups({}, raw_retention_days=90, daily_retention_days=365)
+
+
+if __name__ == '__main__':
+    unittest.main()